@@ -10,12 +10,16 @@ import time
 import json
 import hashlib
 import shutil
+import sqlite3
 import argparse
 import threading
+import concurrent.futures
 import platform
+import re
+import functools
 from datetime import datetime
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, OrderedDict, namedtuple
 import math
 
 try:
@@ -31,77 +35,269 @@ except ImportError:
     print("WARNING: psutil not available. Process attribution will be limited.")
     psutil = None
 
-# Try to import enhanced analyzer
 try:
-    # First try to import numpy and sklearn
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def _json_dumps(obj, pretty=False):
+    """Serialize obj to UTF-8 JSON bytes (stdlib encoder, ASCII-escaped)"""
+    if pretty:
+        return json.dumps(obj, indent=2).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+try:
+    import orjson
+    
+    def _dumps(obj, pretty=False):
+        """Serialize obj to UTF-8 JSON bytes (C encoder)"""
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except orjson.JSONEncodeError:
+            # e.g. non-UTF-8 filenames arrive as surrogate escapes, which
+            # orjson rejects; the stdlib encoder escapes them instead
+            return _json_dumps(obj, pretty)
+except ImportError:
+    orjson = None
+    _dumps = _json_dumps
+
+try:
     import numpy as np
-    from sklearn.ensemble import RandomForestClassifier, IsolationForest
-    from sklearn.preprocessing import StandardScaler
+except ImportError:
+    np = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Byte-frequency features for one buffer
+BytePatterns = namedtuple('BytePatterns', 'variance unique max_freq')
+
+# Path keywords the enhanced analyzer treats as suspicious
+_PATH_KEYWORDS = ('tmp', 'temp', 'appdata')
+
+# Static for the lifetime of the process
+_PLATFORM = platform.system()
+_PLATFORM_LC = _PLATFORM.lower()
+_PY_VER = platform.python_version()
+
+_SYSTEM_INFO = None
+if psutil:
+    try:
+        _SYSTEM_INFO = {
+            'platform': _PLATFORM,
+            'python_version': _PY_VER,
+            'cpu_count': psutil.cpu_count(),
+            'memory_total': psutil.virtual_memory().total
+        }
+    except Exception:
+        pass
+
+# (epoch second, ISO string, compact string) for the current second
+_ts_cache = (None, '', '')
+
+def _now_strings():
+    """Current local time as (ISO, YYYYmmdd_HHMMSS) strings, formatted once per second"""
+    global _ts_cache
+    now = int(time.time())
+    cached = _ts_cache
+    if cached[0] == now:
+        return cached[1], cached[2]
+    
+    dt = datetime.fromtimestamp(now)
+    iso, compact = dt.isoformat(), dt.strftime("%Y%m%d_%H%M%S")
+    _ts_cache = (now, iso, compact)
+    return iso, compact
+
+# Try to import enhanced analyzer
+try:
+    # Enhanced mode requires numpy
+    if np is None:
+        raise ImportError("No module named 'numpy'")
     
     # If successful, enable enhanced mode
     ENHANCED_ANALYSIS = True
     
+    _stats_kernel = None
+    if numba is not None:
+        try:
+            @numba.njit(cache=True, fastmath=True)
+            def _stats_kernel(buf):
+                """Fused histogram/entropy/chi-squared/byte-pattern kernel"""
+                counts = np.zeros(256, np.int64)
+                for b in buf:
+                    counts[b] += 1
+                
+                n = buf.size
+                expected = n / 256.0
+                mean_freq = 1.0 / 256.0
+                entropy = 0.0
+                chi_squared = 0.0
+                sq_dev = 0.0
+                unique_bytes = 0
+                max_count = 0
+                for count in counts:
+                    chi_squared += (count - expected) ** 2
+                    sq_dev += (count / n - mean_freq) ** 2
+                    if count > 0:
+                        p = count / n
+                        entropy -= p * np.log2(p)
+                        unique_bytes += 1
+                        if count > max_count:
+                            max_count = count
+                
+                if n < 256:
+                    chi_squared = 0.0
+                else:
+                    chi_squared /= expected
+                return entropy, chi_squared, unique_bytes, sq_dev / 256.0, max_count / n
+            
+            # Compile now so the JIT cost doesn't land on the first file event
+            _stats_kernel(np.arange(256, dtype=np.uint8))
+        except Exception as e:
+            print(f"INFO: numba kernel unavailable ({e}). Using numpy analysis.")
+            _stats_kernel = None
+    
     class EnhancedFileAnalyzer:
         """Simplified enhanced analyzer embedded in main script"""
         
+        _PATH_RE = re.compile('|'.join(_PATH_KEYWORDS), re.IGNORECASE)
+        
         def __init__(self):
-            self.feature_scaler = StandardScaler()
+            self.feature_scaler = None  # No features are standardized yet
+            # Worker threads share this analyzer, so each gets its own read buffer
+            self._local = threading.local()
+        
+        def _read_head(self, filepath, size=8192):
+            """Read the first bytes of a file into a reusable per-thread buffer"""
+            buf = getattr(self._local, 'buf', None)
+            if buf is None:
+                buf = self._local.buf = np.empty(size, dtype=np.uint8)
+            view = memoryview(buf)
+            
+            n = 0
+            with open(filepath, 'rb', buffering=0) as f:
+                while n < size:
+                    got = f.readinto(view[n:])
+                    if not got:
+                        break
+                    n += got
+            return buf[:n]
+        
+        @staticmethod
+        def _histogram(data):
+            """Count occurrences of each byte value in a single pass"""
+            return np.bincount(data, minlength=256)
         
-        def calculate_chi_squared(self, data):
+        def calculate_chi_squared(self, counts, n):
             """Calculate chi-squared test for randomness"""
-            if len(data) < 256:
+            if n < 256:
                 return 0
             
-            expected = len(data) / 256
-            observed = [0] * 256
-            for byte in data:
-                observed[byte] += 1
-            
-            chi_squared = sum((obs - expected) ** 2 / expected for obs in observed)
-            return chi_squared
+            expected = n / 256.0
+            chi_squared = ((counts - expected) ** 2).sum() / expected
+            return float(chi_squared)
         
-        def analyze_byte_patterns(self, data):
+        def analyze_byte_patterns(self, counts, n):
             """Analyze byte patterns for anomalies"""
-            if not data:
-                return {}
+            if not n:
+                return BytePatterns(0.0, 0, 0.0)
             
             # Calculate byte frequency variance
-            byte_counts = [0] * 256
-            for byte in data:
-                byte_counts[byte] += 1
+            frequencies = counts / n
             
-            total_bytes = len(data)
-            frequencies = [count / total_bytes for count in byte_counts]
+            return BytePatterns(
+                variance=float(frequencies.var()),
+                unique=int((counts > 0).sum()),
+                max_freq=float(frequencies.max())
+            )
+        
+        # Highest score the content checks (entropy, chi-squared, byte patterns) can add
+        MAX_CONTENT_SCORE = 35 + 30 + 25 + 15
+        
+        def static_analysis(self, filepath, stat):
+            """Score the checks that need no file contents: extension, size and path"""
+            suspicion_score = 0
+            reasons = []
             
-            return {
-                'byte_variance': np.var(frequencies),
-                'unique_bytes': sum(1 for count in byte_counts if count > 0),
-                'most_common_byte_freq': max(frequencies)
-            }
+            # Lowercase once; reused for the extension and path checks
+            lc_path = filepath.lower()
+            
+            # File extension and path scoring (from original analyzer)
+            file_ext = os.path.splitext(lc_path)[1]
+            if file_ext in {'.exe', '.dll', '.scr', '.bat', '.cmd', '.vbs', '.ps1'}:
+                suspicion_score += 30
+                reasons.append(f"Suspicious extension: {file_ext}")
+            
+            # File size analysis
+            if file_ext in {'.exe', '.dll'} and stat.st_size < 30000:
+                suspicion_score += 20
+                reasons.append("Small executable (possible dropper)")
+            
+            # Path analysis
+            if _PATH_AC is not None:
+                keyword_hit = _scan_path(lc_path)[1]
+            else:
+                keyword_hit = self._PATH_RE.search(lc_path) is not None
+            if keyword_hit:
+                suspicion_score += 25
+                reasons.append("Suspicious file path")
+            
+            return suspicion_score, reasons, file_ext
         
-        def comprehensive_analysis(self, filepath):
+        def comprehensive_analysis(self, filepath, stat=None, min_score=None):
             """Enhanced analysis with statistical methods"""
             try:
-                with open(filepath, 'rb') as f:
-                    data = f.read(8192)  # Read first 8KB
+                if stat is None:
+                    stat = os.stat(filepath)
+                suspicion_score, reasons, file_ext = self.static_analysis(filepath, stat)
+                file_size = stat.st_size
                 
-                if not data:
-                    return {'suspicion_score': 0, 'reasons': [], 'enhanced': False}
+                # Don't read the file if no content result could lift it to min_score
+                if min_score is not None and suspicion_score + self.MAX_CONTENT_SCORE < min_score:
+                    return {
+                        'suspicion_score': suspicion_score,
+                        'reasons': reasons,
+                        'enhanced': True,
+                        'content_skipped': True,
+                        'file_size': file_size,
+                        'file_extension': file_ext
+                    }
                 
-                # Calculate advanced entropy
-                entropy = self.calculate_entropy(data)
-                chi_squared = self.calculate_chi_squared(data)
-                byte_patterns = self.analyze_byte_patterns(data)
+                data = self._read_head(filepath)  # First 8KB as a uint8 array
                 
-                # Enhanced scoring
-                suspicion_score = 0
-                reasons = []
+                if not data.size:
+                    return {'suspicion_score': 0, 'reasons': [], 'enhanced': False}
                 
-                # File extension and path scoring (from original analyzer)
-                file_ext = Path(filepath).suffix.lower()
-                if file_ext in {'.exe', '.dll', '.scr', '.bat', '.cmd', '.vbs', '.ps1'}:
-                    suspicion_score += 30
-                    reasons.append(f"Suspicious extension: {file_ext}")
+                prefix_hash = _fast_hash(data)
+                
+                # One histogram feeds entropy, chi-squared and byte patterns
+                n = data.size
+                if _stats_kernel is not None:
+                    entropy, chi_squared, unique_bytes, byte_variance, max_freq = \
+                        _stats_kernel(data)
+                    byte_patterns = BytePatterns(byte_variance, unique_bytes, max_freq)
+                else:
+                    counts = self._histogram(data)
+                    entropy = self.calculate_entropy(counts, n)
+                    chi_squared = self.calculate_chi_squared(counts, n)
+                    byte_patterns = self.analyze_byte_patterns(counts, n)
                 
                 # Enhanced entropy analysis
                 if entropy > 7.5:
@@ -120,64 +316,98 @@ try:
                     reasons.append(f"Moderate randomness (chi²: {chi_squared:.1f})")
                 
                 # Byte pattern analysis
-                if byte_patterns['byte_variance'] < 0.001:
+                if byte_patterns.variance < 0.001:
                     suspicion_score += 25
                     reasons.append("Low byte variance (possible encryption)")
                 
-                if byte_patterns['unique_bytes'] < 100:
+                if byte_patterns.unique < 100:
                     suspicion_score += 15
-                    reasons.append(f"Low byte diversity: {byte_patterns['unique_bytes']}")
-                
-                # File size analysis
-                file_size = len(data)
-                if file_ext in {'.exe', '.dll'} and file_size < 30000:
-                    suspicion_score += 20
-                    reasons.append("Small executable (possible dropper)")
-                
-                # Path analysis
-                if any(suspicious_path in filepath.lower() for suspicious_path in ['tmp', 'temp', 'appdata']):
-                    suspicion_score += 25
-                    reasons.append("Suspicious file path")
+                    reasons.append(f"Low byte diversity: {byte_patterns.unique}")
                 
                 return {
                     'suspicion_score': suspicion_score,
                     'reasons': reasons,
                     'entropy': entropy,
                     'chi_squared': chi_squared,
-                    'byte_variance': byte_patterns['byte_variance'],
-                    'unique_bytes': byte_patterns['unique_bytes'],
+                    'byte_variance': byte_patterns.variance,
+                    'unique_bytes': byte_patterns.unique,
                     'enhanced': True,
                     'file_size': file_size,
-                    'file_extension': file_ext
+                    'file_extension': file_ext,
+                    'prefix_hash': prefix_hash
                 }
                 
             except Exception as e:
                 return {'suspicion_score': 0, 'reasons': [], 'error': str(e), 'enhanced': False}
         
-        def calculate_entropy(self, data):
+        def calculate_entropy(self, counts, n):
             """Calculate Shannon entropy"""
-            if not data:
+            if not n:
                 return 0
             
-            byte_counts = [0] * 256
-            for byte in data:
-                byte_counts[byte] += 1
-            
-            entropy = 0
-            total = len(data)
-            for count in byte_counts:
-                if count > 0:
-                    p = count / total
-                    entropy -= p * math.log2(p)
-            
-            return entropy
+            p = counts[counts > 0] / n
+            return float(-(p * np.log2(p)).sum())
     
-    print("INFO: Enhanced statistical analyzer enabled")
+    print("INFO: Enhanced statistical analyzer enabled (numpy)")
     
 except ImportError as e:
     ENHANCED_ANALYSIS = False
     print(f"INFO: Enhanced ML analyzer not available ({e}). Using basic analysis.")
 
+if hasattr(hashlib, 'file_digest'):
+    _file_digest = hashlib.file_digest
+else:
+    def _file_digest(fileobj, digest):
+        """Fallback for hashlib.file_digest on Python < 3.11"""
+        hash_obj = hashlib.new(digest)
+        for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+            hash_obj.update(chunk)
+        return hash_obj
+
+# Non-cryptographic 64-bit content key for in-session bookkeeping
+if blake3 is not None:
+    def _fast_hash(data):
+        """Fast content key (hex) of an in-memory buffer"""
+        return blake3.blake3(data).hexdigest(8)
+elif xxhash is not None:
+    def _fast_hash(data):
+        """Fast content key (hex) of an in-memory buffer"""
+        return xxhash.xxh3_64_hexdigest(data)
+else:
+    def _fast_hash(data):
+        """Fast content key (hex) of an in-memory buffer"""
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+@functools.lru_cache(maxsize=1024)
+def _real_dir(dirpath):
+    """Resolve symlinks in a directory path (events repeat the same dirs)"""
+    return os.path.realpath(dirpath)
+
+@functools.lru_cache(maxsize=4096)
+def _cached_hash(filepath, file_size, mtime_ns, ctime_ns, max_size):
+    """Hash a file; the stat fields in the key invalidate stale entries"""
+    # For very large files, only hash the first portion
+    if file_size > max_size:
+        with open(filepath, 'rb') as f:
+            data = f.read(max_size)
+            sha256_hash = hashlib.sha256(data)
+            
+            return {
+                'sha256': sha256_hash.hexdigest(),
+                'partial_hash': True,
+                'hashed_bytes': len(data)
+            }
+    
+    # For smaller files, hash the entire file (read loop runs in C)
+    with open(filepath, 'rb', buffering=0) as f:
+        sha256_hash = _file_digest(f, 'sha256')
+    
+    return {
+        'sha256': sha256_hash.hexdigest(),
+        'partial_hash': False,
+        'hashed_bytes': file_size
+    }
+
 class FileAnalyzer:
     """Analyzes files for malware-like characteristics"""
     
@@ -205,12 +435,47 @@ class FileAnalyzer:
         ]
     }
     
+    _PATH_RE = None
+    _PATH_NAMES = {}
+    
+    @classmethod
+    def _get_path_re(cls):
+        """Build (once) a single regex matching any of this platform's suspicious paths"""
+        if cls._PATH_RE is None:
+            names = {}
+            for suspicious_path in cls.SUSPICIOUS_PATHS.get(_PLATFORM_LC, []):
+                cleaned = suspicious_path.replace('%', '').replace('*', '')
+                names.setdefault(cleaned.lower(), suspicious_path)
+            if names:
+                pattern = '|'.join(re.escape(cleaned) for cleaned in names)
+                cls._PATH_NAMES = names
+                cls._PATH_RE = re.compile(pattern, re.IGNORECASE)
+            else:
+                cls._PATH_RE = False
+        return cls._PATH_RE
+    
+    @classmethod
+    def match_suspicious_path(cls, lc_path):
+        """Return the SUSPICIOUS_PATHS entry found in a lowercased path, if any"""
+        if _PATH_AC is not None:
+            return _scan_path(lc_path)[0]
+        path_re = cls._get_path_re()
+        match = path_re.search(lc_path) if path_re else None
+        return cls._PATH_NAMES[match.group(0).lower()] if match else None
+    
     @staticmethod
     def calculate_entropy(data):
         """Calculate Shannon entropy of data"""
         if not data:
             return 0
         
+        if np is not None:
+            # Single bincount pass instead of 256 data.count() scans
+            arr = np.frombuffer(data, dtype=np.uint8)
+            counts = np.bincount(arr, minlength=256)
+            p = counts[counts > 0].astype(np.float64) / arr.size
+            return float(-(p * np.log2(p)).sum())
+        
         entropy = 0
         for x in range(256):
             p_x = float(data.count(bytes([x]))) / len(data)
@@ -219,106 +484,167 @@ class FileAnalyzer:
         return entropy
     
     @staticmethod
-    def get_file_hash(filepath, max_size=50*1024*1024):
-        """Calculate SHA256 and MD5 hashes of file (with size limit for performance)"""
+    def get_file_hash(filepath, max_size=50*1024*1024, stat=None):
+        """Calculate SHA256 hash of file (with size limit for performance)"""
         try:
-            file_size = os.path.getsize(filepath)
-            
-            # For very large files, only hash the first portion
-            if file_size > max_size:
-                with open(filepath, 'rb') as f:
-                    data = f.read(max_size)
-                    sha256_hash = hashlib.sha256(data)
-                    md5_hash = hashlib.md5(data)
-                    
-                    return {
-                        'sha256': sha256_hash.hexdigest(),
-                        'md5': md5_hash.hexdigest(),
-                        'partial_hash': True,
-                        'hashed_bytes': len(data)
-                    }
-            
-            # For smaller files, hash the entire file
-            sha256_hash = hashlib.sha256()
-            md5_hash = hashlib.md5()
-            
-            with open(filepath, 'rb') as f:
-                for chunk in iter(lambda: f.read(8192), b""):
-                    sha256_hash.update(chunk)
-                    md5_hash.update(chunk)
-            
-            return {
-                'sha256': sha256_hash.hexdigest(),
-                'md5': md5_hash.hexdigest(),
-                'partial_hash': False,
-                'hashed_bytes': file_size
-            }
+            if stat is None:
+                stat = os.stat(filepath)
+            # Unchanged files (same size/mtime/ctime) are served from the cache
+            return dict(_cached_hash(filepath, stat.st_size, stat.st_mtime_ns,
+                                     stat.st_ctime_ns, max_size))
         except Exception as e:
             return {'error': str(e)}
     
-    def analyze_file(self, filepath):
+    # Highest score the content check (entropy) can add
+    MAX_CONTENT_SCORE = 25
+    
+    def static_analysis(self, filepath, stat):
+        """Score the checks that need no file contents: extension, size and path"""
+        # Lowercase once; reused for the extension and path checks
+        lc_path = filepath.lower()
+        file_ext = os.path.splitext(lc_path)[1]
+        suspicion_score = 0
+        reasons = []
+        
+        # Extension check
+        if file_ext in self.SUSPICIOUS_EXTENSIONS:
+            suspicion_score += 30
+            reasons.append(f"Suspicious extension: {file_ext}")
+        
+        # Small executable files (droppers)
+        if file_ext in {'.exe', '.dll'} and stat.st_size < 50000:
+            suspicion_score += 20
+            reasons.append("Small executable")
+        
+        # Very large files
+        if stat.st_size > 50 * 1024 * 1024:  # 50MB
+            suspicion_score += 15
+            reasons.append("Large file size")
+        
+        # Path-based scoring
+        suspicious_path = self.match_suspicious_path(lc_path)
+        if suspicious_path:
+            suspicion_score += 25
+            reasons.append(f"Suspicious path: {suspicious_path}")
+        
+        return suspicion_score, reasons, file_ext
+    
+    def analyze_file(self, filepath, stat=None, min_score=None):
         """Analyze file for suspicious characteristics"""
         try:
-            stat = os.stat(filepath)
-            file_ext = Path(filepath).suffix.lower()
+            if stat is None:
+                stat = os.stat(filepath)
+            suspicion_score, reasons, file_ext = self.static_analysis(filepath, stat)
+            
+            # Don't read the file if no content result could lift it to min_score
+            if min_score is not None and suspicion_score + self.MAX_CONTENT_SCORE < min_score:
+                return {
+                    'suspicion_score': suspicion_score,
+                    'reasons': reasons,
+                    'content_skipped': True,
+                    'file_size': stat.st_size,
+                    'file_extension': file_ext
+                }
             
             # Read file for entropy calculation
             entropy = 0
             magic_bytes = b''
+            prefix_hash = ''
             try:
                 with open(filepath, 'rb') as f:
                     data = f.read(8192)  # Read first 8KB for analysis
                     if data:
                         entropy = self.calculate_entropy(data)
                         magic_bytes = data[:16]
+                        prefix_hash = _fast_hash(data)
             except:
                 pass
             
-            # Calculate suspicion score
-            suspicion_score = 0
-            reasons = []
-            
-            # Extension check
-            if file_ext in self.SUSPICIOUS_EXTENSIONS:
-                suspicion_score += 30
-                reasons.append(f"Suspicious extension: {file_ext}")
-            
             # High entropy (likely packed/encrypted)
             if entropy > 7.0:
                 suspicion_score += 25
                 reasons.append(f"High entropy: {entropy:.2f}")
             
-            # Small executable files (droppers)
-            if file_ext in {'.exe', '.dll'} and stat.st_size < 50000:
-                suspicion_score += 20
-                reasons.append("Small executable")
-            
-            # Very large files
-            if stat.st_size > 50 * 1024 * 1024:  # 50MB
-                suspicion_score += 15
-                reasons.append("Large file size")
-            
-            # Path-based scoring
-            current_platform = platform.system().lower()
-            if current_platform in self.SUSPICIOUS_PATHS:
-                for suspicious_path in self.SUSPICIOUS_PATHS[current_platform]:
-                    if suspicious_path.replace('%', '').replace('*', '') in filepath:
-                        suspicion_score += 25
-                        reasons.append(f"Suspicious path: {suspicious_path}")
-                        break
-            
             return {
                 'suspicion_score': suspicion_score,
                 'reasons': reasons,
                 'entropy': entropy,
                 'magic_bytes': magic_bytes.hex() if magic_bytes else '',
                 'file_size': stat.st_size,
-                'file_extension': file_ext
+                'file_extension': file_ext,
+                'prefix_hash': prefix_hash
             }
             
         except Exception as e:
             return {'error': str(e)}
 
+def _build_path_automaton():
+    """One Aho-Corasick automaton over both analyzers' path patterns"""
+    if ahocorasick is None:
+        return None
+    
+    # word -> [SUSPICIOUS_PATHS entry or None, is enhanced keyword]
+    words = {}
+    for suspicious_path in FileAnalyzer.SUSPICIOUS_PATHS.get(_PLATFORM_LC, []):
+        cleaned = suspicious_path.replace('%', '').replace('*', '').lower()
+        words.setdefault(cleaned, [suspicious_path, False])
+    for keyword in _PATH_KEYWORDS:
+        words.setdefault(keyword, [None, False])[1] = True
+    
+    automaton = ahocorasick.Automaton()
+    for word, (suspicious_path, is_keyword) in words.items():
+        automaton.add_word(word, (suspicious_path, is_keyword))
+    automaton.make_automaton()
+    return automaton
+
+_PATH_AC = _build_path_automaton()
+
+def _scan_path(lc_path):
+    """Single pass over a lowercased path: (first SUSPICIOUS_PATHS hit, any keyword hit)"""
+    suspicious_path = None
+    keyword_hit = False
+    for _end, (path_hit, is_keyword) in _PATH_AC.iter(lc_path):
+        if suspicious_path is None:
+            suspicious_path = path_hit
+        keyword_hit = keyword_hit or is_keyword
+        if suspicious_path and keyword_hit:
+            break
+    return suspicious_path, keyword_hit
+
+class _BloomFilter:
+    """Fixed-size Bloom filter over string keys; may report false positives"""
+    
+    def __init__(self, num_bits=1 << 19, num_hashes=7, capacity=25000):
+        # 64KB of bits holds ~25k keys at a ~1e-4 false positive rate
+        self._bits = bytearray(num_bits // 8)
+        self._num_bits = num_bits
+        self._num_hashes = num_hashes
+        self._capacity = capacity
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._num_bits for i in range(self._num_hashes)]
+    
+    def add(self, key):
+        """Add key; returns True if it was (probably) already present"""
+        positions = self._positions(key)
+        with self._lock:
+            if all(self._bits[p >> 3] & (1 << (p & 7)) for p in positions):
+                return True
+            
+            # Start over once full rather than let the false positive rate climb
+            if self._count >= self._capacity:
+                self._bits = bytearray(len(self._bits))
+                self._count = 0
+            for p in positions:
+                self._bits[p >> 3] |= 1 << (p & 7)
+            self._count += 1
+            return False
+
 class MalwareFileHandler(FileSystemEventHandler):
     """Handles file system events and filters for suspicious files"""
     
@@ -334,49 +660,107 @@ class MalwareFileHandler(FileSystemEventHandler):
         else:
             self.enhanced_analyzer = None
             
-        self.processed_files = set()
+        # Recently seen (filepath, event_type) -> monotonic timestamp, oldest first
+        self._recent = OrderedDict()
+        self._recent_ttl = 2.0
+        self._recent_max = 8192
         self.lock = threading.Lock()
+        
+        # Resolved once so every event can skip our own output directory cheaply
+        self._output_dir_str = os.path.realpath(monitor.output_dir)
+        
+        # Analysis runs off the observer thread; the semaphore bounds queued work
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 2),
+            thread_name_prefix="malwatch-worker")
+        self._slots = threading.BoundedSemaphore(64)
+        
+        # (filepath, size, prefix hash) of content already processed
+        self._seen_content = _BloomFilter()
     
     def on_created(self, event):
         if not event.is_directory:
-            self.process_file(event.src_path, 'created')
+            self.queue_file(event.src_path, 'created')
     
     def on_modified(self, event):
         if not event.is_directory:
-            self.process_file(event.src_path, 'modified')
+            self.queue_file(event.src_path, 'modified')
     
     def on_moved(self, event):
         if not event.is_directory:
-            self.process_file(event.dest_path, 'moved')
+            self.queue_file(event.dest_path, 'moved')
+    
+    def is_duplicate_event(self, filepath, event_type):
+        """Check (and record) whether this event was seen within the dedup window"""
+        with self.lock:
+            file_key = (filepath, event_type)
+            now = time.monotonic()
+            last_seen = self._recent.get(file_key)
+            if last_seen is not None and now - last_seen < self._recent_ttl:
+                return True
+            self._recent[file_key] = now
+            self._recent.move_to_end(file_key)
+            
+            # Evict the oldest entry to keep memory bounded
+            if len(self._recent) > self._recent_max:
+                self._recent.popitem(last=False)
+            return False
+    
+    def queue_file(self, filepath, event_type):
+        """Dedup an event on the observer thread and hand it to the worker pool"""
+        # Avoid processing the same file multiple times rapidly
+        if self.is_duplicate_event(filepath, event_type):
+            return
+        
+        # Blocks the observer thread when too much work is already queued
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self.process_file, filepath, event_type)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            return
+        future.add_done_callback(lambda _: self._slots.release())
+    
+    def shutdown(self):
+        """Wait for queued analysis to finish"""
+        self._pool.shutdown(wait=True)
     
     def process_file(self, filepath, event_type):
         """Process and analyze a file for suspicious characteristics"""
         try:
-            # Avoid processing the same file multiple times rapidly
-            with self.lock:
-                file_key = f"{filepath}:{event_type}:{int(time.time())}"
-                if file_key in self.processed_files:
-                    return
-                self.processed_files.add(file_key)
-            
-            # Clean up old entries to prevent memory leaks
-            if len(self.processed_files) > 10000:
-                self.processed_files.clear()
-            
-            if not os.path.exists(filepath):
+            # Skip our own output directory
+            if self.is_output_path(filepath):
                 return
             
-            # Skip our own output directory
-            if str(self.monitor.output_dir) in filepath:
+            # Single stat per event, shared by analysis, metadata and hashing
+            try:
+                stat = os.stat(filepath)
+            except OSError:
                 return
             
+            # Lowest score the event can be kept with below; lets the analyzers
+            # skip reading the file when its static score can't get there
+            min_score = None if self.monitor.ml_mode else self.monitor.min_suspicion_score
+            if stat.st_size > 10 * 1024 * 1024:
+                large_min = self.monitor.preserve_threshold + 10
+                min_score = large_min if min_score is None else max(min_score, large_min)
+            
             # Analyze file
             if self.enhanced_analyzer and self.monitor.ml_mode:
                 # Use enhanced ML analysis
-                analysis = self.enhanced_analyzer.comprehensive_analysis(filepath)
+                analysis = self.enhanced_analyzer.comprehensive_analysis(filepath, stat, min_score)
             else:
                 # Use basic rule-based analysis
-                analysis = self.analyzer.analyze_file(filepath)
+                analysis = self.analyzer.analyze_file(filepath, stat, min_score)
+            
+            # Skip content-identical repeats (e.g. regenerated build artifacts);
+            # only log-only events are filtered, so a payload swapped behind an
+            # unchanged size and prefix still reaches preservation
+            prefix_hash = analysis.get('prefix_hash')
+            if prefix_hash and analysis.get('suspicion_score', 0) < self.monitor.preserve_threshold:
+                if self._seen_content.add(f"{filepath}\0{stat.st_size}\0{prefix_hash}"):
+                    return
             
             # Apply filtering
             if not self.monitor.ml_mode:
@@ -385,7 +769,7 @@ class MalwareFileHandler(FileSystemEventHandler):
                     return
             
             # Add file size limits for very large files to reduce noise
-            file_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+            file_size = stat.st_size
             if file_size > 10 * 1024 * 1024:  # 10MB
                 # For large files, be more selective about preservation
                 if analysis.get('suspicion_score', 0) < self.monitor.preserve_threshold + 10:
@@ -394,30 +778,47 @@ class MalwareFileHandler(FileSystemEventHandler):
                     return
             
             # Get file metadata
-            metadata = self.get_file_metadata(filepath, event_type, analysis)
+            metadata = self.get_file_metadata(filepath, event_type, analysis, stat)
+            preserve = analysis.get('suspicion_score', 0) >= self.monitor.preserve_threshold
+            
+            # Hashes are only needed for files we are going to preserve
+            if preserve:
+                metadata['hashes'] = self.analyzer.get_file_hash(filepath, stat=stat)
             
             # Log the event
             self.monitor.log_event(filepath, metadata)
             
             # Preserve the file if it's suspicious enough
-            if analysis.get('suspicion_score', 0) >= self.monitor.preserve_threshold:
+            if preserve:
                 self.monitor.preserve_file(filepath, metadata)
             
         except Exception as e:
             if self.monitor.verbose:
                 print(f"Error processing {filepath}: {e}")
     
-    def get_file_metadata(self, filepath, event_type, analysis):
+    def is_output_path(self, filepath):
+        """Check whether a path lies inside the monitor's output directory"""
+        try:
+            # Symlinks (e.g. macOS /tmp -> /private/tmp) resolved per directory
+            dirpath, name = os.path.split(os.path.abspath(filepath))
+            realpath = os.path.join(_real_dir(dirpath), name)
+            return os.path.commonpath([self._output_dir_str, realpath]) == self._output_dir_str
+        except ValueError:
+            # Different drives on Windows
+            return False
+    
+    def get_file_metadata(self, filepath, event_type, analysis, stat=None):
         """Collect comprehensive metadata about the file"""
         metadata = {
             'filepath': filepath,
             'event_type': event_type,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': _now_strings()[0],
             'analysis': analysis
         }
         
         try:
-            stat = os.stat(filepath)
+            if stat is None:
+                stat = os.stat(filepath)
             metadata.update({
                 'size': stat.st_size,
                 'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
@@ -428,25 +829,50 @@ class MalwareFileHandler(FileSystemEventHandler):
         except Exception as e:
             metadata['stat_error'] = str(e)
         
-        # Get file hashes
-        hashes = self.analyzer.get_file_hash(filepath)
-        metadata['hashes'] = hashes
-        
         # Try to get process attribution
-        if psutil:
+        if _SYSTEM_INFO is not None:
+            # This is a simplified approach - in practice, you'd want
+            # more sophisticated process tracking. Shared, never mutated.
+            metadata['system_info'] = _SYSTEM_INFO
+        
+        return metadata
+
+_FICLONE = 0x40049409  # Linux ioctl: share extents with another file (reflink)
+
+def _kernel_copy(src, dst):
+    """Copy file data without bouncing it through user space; False if unsupported"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        # Copy-on-write clone (Btrfs, XFS, ...): only metadata is written
+        if fcntl is not None and _PLATFORM_LC == 'linux':
             try:
-                # This is a simplified approach - in practice, you'd want
-                # more sophisticated process tracking
-                metadata['system_info'] = {
-                    'platform': platform.system(),
-                    'python_version': platform.python_version(),
-                    'cpu_count': psutil.cpu_count(),
-                    'memory_total': psutil.virtual_memory().total
-                }
-            except:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                return True
+            except OSError:
                 pass
         
-        return metadata
+        # In-kernel copy, loop until EOF in case the file is still growing.
+        # Some filesystems and special files report 0 before EOF, so a
+        # short total means the copy didn't happen
+        if hasattr(os, 'copy_file_range'):
+            try:
+                size = os.fstat(fsrc.fileno()).st_size
+                copied = 0
+                while True:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30)
+                    if not n:
+                        break
+                    copied += n
+                if copied >= size:
+                    return True
+            except OSError:
+                pass
+    return False
+
+def _fast_copy(src, dst):
+    """Equivalent of shutil.copy2 that prefers reflink / copy_file_range"""
+    if not _kernel_copy(src, dst):
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
 
 class MalwareMonitor:
     """Main monitoring class"""
@@ -465,7 +891,7 @@ class MalwareMonitor:
         # Initialize components
         self.observer = Observer()
         self.handler = MalwareFileHandler(self)
-        self.event_log = []
+        self.total_events = 0
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # Session directory
@@ -476,6 +902,29 @@ class MalwareMonitor:
         self.preserved_dir = self.session_dir / "preserved_files"
         self.preserved_dir.mkdir(exist_ok=True)
         
+        # Events are appended as NDJSON (one JSON object per line)
+        self.events_path = self.session_dir / "events.ndjson"
+        self._events_fp = open(self.events_path, 'ab', buffering=1 << 16)
+        self._events_lock = threading.Lock()
+        
+        # Metadata for preserved files, one row per SHA256 (shared by workers)
+        self._db = sqlite3.connect(str(self.session_dir / "preserved.sqlite"),
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # WAL stays consistent on a crash at NORMAL; skipping the per-commit
+        # fsync keeps each metadata row cheaper than the old sidecar files
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS preserved '
+                         '(sha256 TEXT UNIQUE, path BLOB, metadata BLOB)')
+        self._preserve_lock = threading.Lock()
+        
+        # SHA256 -> preserved filename, so duplicate checks never touch the DB
+        self._preserved_hashes = {
+            sha256: Path(os.fsdecode(path)).name
+            for sha256, path in self._db.execute(
+                'SELECT sha256, path FROM preserved WHERE sha256 IS NOT NULL')
+        }
+        
         print(f"Session directory: {self.session_dir}")
         if self.verbose:
             print(f"ML mode: {'enabled' if self.ml_mode else 'disabled'}")
@@ -498,7 +947,8 @@ This directory contains files and metadata captured by the malware monitoring to
 - `YYYY-MM-DD/` - Daily directories
   - `session_YYYYMMDD_HHMMSS/` - Individual monitoring sessions
     - `preserved_files/` - Suspicious files that were preserved
-    - `events.json` - Log of all file system events
+    - `preserved.sqlite` - Metadata for each preserved file (`preserved` table)
+    - `events.ndjson` - Log of all file system events (one JSON object per line)
     - `metadata.json` - Session metadata
 
 ## Files:
@@ -519,12 +969,15 @@ This directory contains files and metadata captured by the malware monitoring to
     def log_event(self, filepath, metadata):
         """Log a file system event"""
         event = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': _now_strings()[0],
             'filepath': filepath,
             'metadata': metadata
         }
         
-        self.event_log.append(event)
+        line = _dumps(event) + b'\n'
+        with self._events_lock:
+            self._events_fp.write(line)
+            self.total_events += 1
         
         if self.verbose:
             score = metadata.get('analysis', {}).get('suspicion_score', 0)
@@ -539,32 +992,46 @@ This directory contains files and metadata captured by the malware monitoring to
         """Preserve a suspicious file"""
         try:
             # Create safe filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = _now_strings()[1]
             original_name = Path(filepath).name
             safe_name = f"{timestamp}_{original_name}"
             
             # Check for duplicates using hash
             file_hash = metadata.get('hashes', {}).get('sha256', '')
             if file_hash:
-                # Check if we already have this file
-                existing_files = list(self.preserved_dir.glob(f"*{file_hash[:8]}*"))
-                if existing_files:
-                    if self.verbose:
-                        print(f"Duplicate file skipped (hash: {file_hash[:8]}...) - already preserved as {existing_files[0].name}")
-                    return
-                
                 # Include hash in filename
                 safe_name = f"{timestamp}_{file_hash[:8]}_{original_name}"
             
             dest_path = self.preserved_dir / safe_name
             
-            # Copy the file
-            shutil.copy2(filepath, dest_path)
+            # Claim the hash before copying so concurrent workers skip it
+            if file_hash:
+                with self._preserve_lock:
+                    existing = self._preserved_hashes.get(file_hash)
+                    if existing is None:
+                        self._preserved_hashes[file_hash] = dest_path.name
+                if existing is not None:
+                    if self.verbose:
+                        print(f"Duplicate file skipped (hash: {file_hash[:8]}...) - already preserved as {existing}")
+                    return
             
-            # Save metadata
-            metadata_path = dest_path.with_suffix(dest_path.suffix + '.meta.json')
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            # Copy the file and save metadata; on failure release the hash
+            # claim and drop any copy left without a row
+            try:
+                _fast_copy(filepath, str(dest_path))
+                # Path stored as raw bytes: non-UTF-8 names can't bind as TEXT
+                with self._preserve_lock:
+                    self._db.execute('INSERT OR IGNORE INTO preserved VALUES (?, ?, ?)',
+                                     (file_hash or None, os.fsencode(dest_path), _dumps(metadata)))
+            except Exception:
+                if file_hash:
+                    with self._preserve_lock:
+                        self._preserved_hashes.pop(file_hash, None)
+                try:
+                    dest_path.unlink()
+                except OSError:
+                    pass
+                raise
             
             print(f"PRESERVED: {filepath} -> {dest_path}")
             
@@ -574,27 +1041,29 @@ This directory contains files and metadata captured by the malware monitoring to
     def save_session_data(self):
         """Save session data to disk"""
         try:
-            # Save events log
-            events_path = self.session_dir / "events.json"
-            with open(events_path, 'w') as f:
-                json.dump(self.event_log, f, indent=2)
+            # Push buffered events to disk
+            with self._events_lock:
+                self._events_fp.flush()
+            
+            with self._preserve_lock:
+                preserved_count = self._db.execute('SELECT COUNT(*) FROM preserved').fetchone()[0]
             
             # Save session metadata
             metadata_path = self.session_dir / "metadata.json"
             session_metadata = {
                 'session_id': self.session_id,
                 'start_time': datetime.now().isoformat(),
-                'platform': platform.system(),
-                'python_version': platform.python_version(),
+                'platform': _PLATFORM,
+                'python_version': _PY_VER,
                 'ml_mode': self.ml_mode,
                 'min_suspicion_score': self.min_suspicion_score,
                 'preserve_threshold': self.preserve_threshold,
-                'total_events': len(self.event_log),
-                'preserved_files': len(list(self.preserved_dir.glob("*"))) // 2  # Divide by 2 for .meta files
+                'total_events': self.total_events,
+                'preserved_files': preserved_count
             }
             
-            with open(metadata_path, 'w') as f:
-                json.dump(session_metadata, f, indent=2)
+            with open(metadata_path, 'wb') as f:
+                f.write(_dumps(session_metadata, pretty=True))
                 
         except Exception as e:
             print(f"ERROR saving session data: {e}")
@@ -603,7 +1072,7 @@ This directory contains files and metadata captured by the malware monitoring to
         """Start monitoring file system"""
         if paths is None:
             # Default paths based on platform
-            system = platform.system().lower()
+            system = _PLATFORM_LC
             if system == 'windows':
                 paths = [
                     os.path.expandvars(r'%TEMP%'),
@@ -637,20 +1106,27 @@ This directory contains files and metadata captured by the malware monitoring to
         self.observer.start()
         print(f"Monitoring started. Session: {self.session_id}")
         
+        last_save = time.monotonic()
+        saved_events = 0
         try:
             while True:
                 time.sleep(1)
                 
                 # Periodically save session data
-                if len(self.event_log) % 100 == 0 and len(self.event_log) > 0:
+                if time.monotonic() - last_save >= 5 and self.total_events != saved_events:
+                    saved_events = self.total_events
                     self.save_session_data()
+                    last_save = time.monotonic()
                     
         except KeyboardInterrupt:
             print("\nShutting down...")
             self.observer.stop()
-            self.save_session_data()
         
         self.observer.join()
+        self.handler.shutdown()
+        self.save_session_data()
+        self._events_fp.close()
+        self._db.close()
         print("Monitoring stopped.")
 
 def main():
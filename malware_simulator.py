@@ -262,6 +262,16 @@ echo "Simulation complete"
         
         print(f"Created persistence files in: {startup_dir}")
     
+    def simulate_non_utf8_filename(self):
+        """Drop an executable whose name is not valid UTF-8 (POSIX only)"""
+        if platform.system().lower() == 'windows':
+            return
+        
+        print("\\nCreating file with non-UTF-8 name...")
+        # Python surfaces the raw 0xff byte as a surrogate escape ('\udcff');
+        # the monitor must still log and preserve the file
+        self.create_fake_executable(self.suspicious_paths[0] / os.fsdecode(b'update\xff.exe'))
+    
     def run_full_simulation(self):
         """Run a comprehensive malware simulation"""
         print("="*60)
@@ -319,6 +329,8 @@ echo "Simulation complete"
                 self.create_high_entropy_file(filepath, size=random.randint(10000, 50000))
             time.sleep(0.5)
         
+        self.simulate_non_utf8_filename()
+        
         print("\\n" + "="*60)
         print("SIMULATION COMPLETE")
         print("="*60)
@@ -396,6 +408,7 @@ def main():
                 simulator.simulate_rapid_file_creation(num_files=10, delay=0.2)
                 time.sleep(1)
                 simulator.simulate_persistence_mechanisms()
+                simulator.simulate_non_utf8_filename()
             else:
                 simulator.run_full_simulation()
     